@@ -161,3 +161,25 @@ class Bits:
 
 def get_mask(bit: int) -> int:
     return 1 << (7 - bit)
+
+
+SIZE_HEADER_BYTES = 4
+
+
+def size_header(size: int, length: int = SIZE_HEADER_BYTES) -> bytearray:
+    return bytearray(size.to_bytes(length, "big"))
+
+
+def read_size_header(
+    text: bytearray, max_size: Optional[int] = None, length: int = SIZE_HEADER_BYTES
+) -> int:
+    if len(text) < length:
+        raise ValueError("The text to decode is missing its size header")
+
+    size = int.from_bytes(text[:length], "big")
+    if max_size is not None and size > max_size:
+        raise ValueError(
+            f"Uncompressed size of {size} bytes exceeds the limit of {max_size} bytes"
+        )
+
+    return size
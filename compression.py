@@ -1,15 +1,30 @@
+import argparse
+import sys
+from typing import Optional
+
 from tqdm import tqdm
 
+from bitsandbytes import read_size_header, size_header
 from file_handeling import read_file, write_file
-from huffingcodes import huffing_decode, huffing_encode
-from lempelziv import lempelziv_decode, lempelziv_encode
+from frames import encode_frames, parse_frames, read_frames, verify_frames
+from huffingcodes import huffing_max_decoded_size
+from lempelziv import lempelziv_decode, lempelziv_encode, lempelziv_max_decoded_size
+
+MAX_OUTPUT_SIZE = 1 << 30
+
+# The stage headers only hold a frame, but the whole stream can be larger
+STREAM_HEADER_BYTES = 8
 
 
 def encode(text: str | bytearray) -> bytearray:
     if isinstance(text, str):
         text = bytearray(text, "utf-8")
 
-    return huffing_encode(lempelziv_encode(text))
+    out = size_header(len(text), STREAM_HEADER_BYTES)
+    for frame in encode_frames(text):
+        out += frame.to_byte_array()
+
+    return out
 
 
 def encode_to_file(file_name: str, text: str | bytearray):
@@ -21,16 +36,97 @@ def encode_file(file_name: str):
     encode_to_file(file_name + ".compressed", file)
 
 
-def decode(text: bytearray) -> bytearray:
-    return lempelziv_decode(huffing_decode(text))
+def decoded_size(text: bytearray, max_size: int = MAX_OUTPUT_SIZE) -> int:
+    # Reject sizes the text can't possibly expand to before allocating
+    limit = lempelziv_max_decoded_size(huffing_max_decoded_size(len(text)))
+    return read_size_header(text, min(limit, max_size), STREAM_HEADER_BYTES)
+
+
+def decode(text: bytearray, max_size: int = MAX_OUTPUT_SIZE) -> bytearray:
+    out = bytearray(decoded_size(text, max_size))
+    decode_into(text, out, max_size)
+    return out
+
+
+def decode_into(
+    text: bytearray, buffer: bytearray | memoryview, max_size: int = MAX_OUTPUT_SIZE
+) -> int:
+    size = decoded_size(text, max_size)
+    if size > len(buffer):
+        raise ValueError(f"Buffer is too small to hold {size} bytes")
+
+    out = memoryview(buffer)
+    written = 0
+    frames = parse_frames(memoryview(text)[STREAM_HEADER_BYTES:])
+    for index, frame in enumerate(frames):
+        # The frame size can only be trusted once the header checksum matches
+        if not frame.verify_compressed():
+            raise ValueError(
+                f"Frame {index}: checksum mismatch in the compressed frame"
+            )
+        if written + frame.size > size:
+            raise ValueError(f"Frame {index}: frame is larger than the text")
+
+        try:
+            written += frame.decode_into(
+                out[written : written + frame.size], verified=True
+            )
+        except ValueError as e:
+            raise ValueError(f"Frame {index}: {e}") from e
+
+    if written != size:
+        raise ValueError("The text to decode is truncated")
+
+    return written
 
 
-def decode_file(file_name: str) -> bytearray:
-    return decode(read_file(file_name))
+def decode_file(file_name: str, max_size: int = MAX_OUTPUT_SIZE) -> bytearray:
+    return decode(read_file(file_name), max_size)
 
 
-def decode_and_write_file(file_name: str):
-    write_file(file_name + ".uncompressed", decode_file(file_name))
+def decode_and_write_file(file_name: str, max_size: int = MAX_OUTPUT_SIZE):
+    write_file(file_name + ".uncompressed", decode_file(file_name, max_size))
+
+
+def verify(
+    text: bytearray,
+    full: bool = False,
+    max_workers: Optional[int] = None,
+    max_size: Optional[int] = None,
+) -> list[int]:
+    """
+    Returns the indices of the corrupt frames. By default only the checksums
+    of the compressed frames are checked, a full verify also decodes them.
+    Verifying never holds more than a frame in memory, so there is no size
+    limit unless max_size is given.
+    """
+    size = read_size_header(text, max_size, STREAM_HEADER_BYTES)
+    frames = parse_frames(memoryview(text)[STREAM_HEADER_BYTES:])
+    frames_size, corrupt = verify_frames(frames, full, max_workers, size)
+    # Corrupt frames don't count towards the size
+    if not corrupt and frames_size != size:
+        raise ValueError("The text to decode is truncated")
+
+    return corrupt
+
+
+def verify_file(
+    file_name: str,
+    full: bool = False,
+    max_workers: Optional[int] = None,
+    max_size: Optional[int] = None,
+) -> list[int]:
+    with open(file_name, "rb") as f:
+        size = read_size_header(
+            f.read(STREAM_HEADER_BYTES), max_size, STREAM_HEADER_BYTES
+        )
+        frames_size, corrupt = verify_frames(read_frames(f), full, max_workers, size)
+
+    # Corrupt frames don't count towards the size
+    if not corrupt and frames_size != size:
+        raise ValueError("The text to decode is truncated")
+
+    return corrupt
 
 
 def easy():
@@ -82,5 +178,56 @@ def hard():
         decode_and_write_file(file + ".compressed")
 
 
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command")
+
+    encode_parser = subparsers.add_parser("encode")
+    encode_parser.add_argument("files", nargs="+")
+
+    decode_parser = subparsers.add_parser("decode")
+    decode_parser.add_argument("files", nargs="+")
+    decode_parser.add_argument(
+        "--max-size",
+        type=int,
+        default=MAX_OUTPUT_SIZE,
+        help="largest uncompressed size to accept, in bytes",
+    )
+
+    verify_parser = subparsers.add_parser("verify")
+    verify_parser.add_argument("files", nargs="+")
+    verify_parser.add_argument(
+        "--full", action="store_true", help="decode and check the uncompressed data"
+    )
+    verify_parser.add_argument("--workers", type=int, default=None)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        hard()
+        return 0
+
+    status = 0
+    for file in args.files:
+        if args.command == "encode":
+            encode_file(file)
+        elif args.command == "decode":
+            decode_and_write_file(file, args.max_size)
+        else:
+            try:
+                corrupt = verify_file(file, args.full, args.workers)
+            except ValueError as e:
+                print(f"{file}: {e}")
+                status = 1
+                continue
+
+            if corrupt:
+                print(f"{file}: corrupt frames {', '.join(map(str, corrupt))}")
+                status = 1
+            else:
+                print(f"{file}: OK")
+
+    return status
+
+
 if __name__ == "__main__":
-    hard()
+    sys.exit(main())
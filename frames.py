@@ -0,0 +1,225 @@
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from huffingcodes import huffing_decode, huffing_encode, huffing_max_decoded_size
+from lempelziv import (
+    lempelziv_decode_into,
+    lempelziv_encode,
+    lempelziv_max_decoded_size,
+    lempelziv_max_encoded_size,
+)
+
+FRAME_SIZE = 1 << 20
+
+# Uncompressed size, compressed size, uncompressed checksum, compressed checksum
+FRAME_HEADER = struct.Struct(">IIII")
+
+# The header fields covered by the compressed checksum
+CHECKED_HEADER = struct.Struct(">III")
+
+# Huffman codes for a frame stay far below 64 bits, so a payload never takes
+# more than eight bytes per byte of the LZ stage, plus the code table.
+MAX_PAYLOAD_SIZE = 8 * lempelziv_max_encoded_size(FRAME_SIZE) + 1024
+
+
+def checksum(data: bytearray | memoryview) -> int:
+    return zlib.crc32(data)
+
+
+def compressed_checksum(
+    size: int, _checksum: int, payload: bytearray | memoryview
+) -> int:
+    header = CHECKED_HEADER.pack(size, len(payload), _checksum)
+    return zlib.crc32(payload, zlib.crc32(header))
+
+
+@dataclass
+class Frame:
+    size: int
+    checksum: int
+    compressed_checksum: int
+    payload: bytearray | memoryview
+
+    @classmethod
+    def encode(cls, text: bytearray | memoryview) -> "Frame":
+        payload = huffing_encode(lempelziv_encode(bytearray(text)))
+        _checksum = checksum(text)
+        return cls(
+            len(text),
+            _checksum,
+            compressed_checksum(len(text), _checksum, payload),
+            payload,
+        )
+
+    @classmethod
+    def from_header(
+        cls, header: bytes | memoryview, payload: bytearray | memoryview
+    ) -> "Frame":
+        size, compressed_size, _checksum, compressed_checksum = FRAME_HEADER.unpack(
+            header
+        )
+        if len(payload) != compressed_size:
+            raise ValueError("The text to decode is truncated")
+        return cls(size, _checksum, compressed_checksum, payload)
+
+    def to_byte_array(self) -> bytearray:
+        header = FRAME_HEADER.pack(
+            self.size, len(self.payload), self.checksum, self.compressed_checksum
+        )
+        return bytearray(header) + self.payload
+
+    def verify_compressed(self) -> bool:
+        """Checks everything but the uncompressed data, header included."""
+        max_size = lempelziv_max_decoded_size(
+            huffing_max_decoded_size(len(self.payload))
+        )
+        return self.size <= max_size and self.compressed_checksum == (
+            compressed_checksum(self.size, self.checksum, self.payload)
+        )
+
+    def decode_into(
+        self, buffer: bytearray | memoryview, verified: bool = False
+    ) -> int:
+        """Set verified if verify_compressed has already passed."""
+        if not verified and not self.verify_compressed():
+            raise ValueError("Checksum mismatch in the compressed frame")
+
+        lempelziv_stage = huffing_decode(
+            self.payload, max_size=lempelziv_max_encoded_size(self.size)
+        )
+        written = lempelziv_decode_into(lempelziv_stage, buffer, max_size=self.size)
+        if written != self.size:
+            raise ValueError("Frame size does not match its contents")
+
+        if checksum(memoryview(buffer)[:written]) != self.checksum:
+            raise ValueError("Checksum mismatch in the uncompressed frame")
+
+        return written
+
+    def verify(
+        self, buffer: Optional[bytearray] = None, verified: bool = False
+    ) -> bool:
+        if buffer is None or len(buffer) < self.size:
+            buffer = bytearray(self.size)
+
+        try:
+            self.decode_into(buffer, verified)
+        except ValueError:
+            return False
+        return True
+
+
+def payload_size(index: int, header: bytes | memoryview) -> int:
+    if len(header) < FRAME_HEADER.size:
+        raise ValueError(f"Frame {index}: the text to decode is truncated")
+
+    # Checked before reading, as the header isn't verified yet
+    compressed_size = FRAME_HEADER.unpack(header)[1]
+    if compressed_size > MAX_PAYLOAD_SIZE:
+        raise ValueError(
+            f"Frame {index}: compressed size of {compressed_size} bytes exceeds "
+            f"the limit of {MAX_PAYLOAD_SIZE} bytes"
+        )
+
+    return compressed_size
+
+
+def encode_frames(
+    text: bytearray | memoryview, frame_size: int = FRAME_SIZE
+) -> Iterator[Frame]:
+    text = memoryview(text)
+    for start in range(0, len(text), frame_size):
+        yield Frame.encode(text[start : start + frame_size])
+
+
+def parse_frames(text: bytearray | memoryview) -> Iterator[Frame]:
+    text = memoryview(text)
+    i = 0
+    index = 0
+    while i < len(text):
+        header = text[i : i + FRAME_HEADER.size]
+        compressed_size = payload_size(index, header)
+        i += FRAME_HEADER.size
+
+        payload = text[i : i + compressed_size]
+        if len(payload) < compressed_size:
+            raise ValueError(f"Frame {index}: the text to decode is truncated")
+
+        yield Frame.from_header(header, payload)
+        i += compressed_size
+        index += 1
+
+
+def read_frames(file: BinaryIO) -> Iterator[Frame]:
+    index = 0
+    while header := file.read(FRAME_HEADER.size):
+        compressed_size = payload_size(index, header)
+        payload = file.read(compressed_size)
+        if len(payload) < compressed_size:
+            raise ValueError(f"Frame {index}: the text to decode is truncated")
+
+        yield Frame.from_header(header, payload)
+        index += 1
+
+
+def verify_frames(
+    frames: Iterable[Frame],
+    full: bool = False,
+    max_workers: Optional[int] = None,
+    max_size: Optional[int] = None,
+) -> tuple[int, list[int]]:
+    """
+    Returns the total uncompressed size of the intact frames and the indices
+    of the frames that failed verification. The compressed checksums are
+    checked in parallel, a full verify decodes the frames one at a time.
+    """
+    size = 0
+    corrupt: list[int] = list()
+
+    # Only called for frames whose header passed the compressed checksum
+    def add_size(index: int, frame: Frame):
+        nonlocal size
+        size += frame.size
+        if max_size is not None and size > max_size:
+            raise ValueError(
+                f"Frame {index} exceeds the limit of {max_size} bytes"
+            )
+
+    if full:
+        buffer = bytearray(FRAME_SIZE)
+        for index, frame in enumerate(frames):
+            if not frame.verify_compressed():
+                corrupt.append(index)
+                continue
+
+            add_size(index, frame)
+            if not frame.verify(buffer, verified=True):
+                corrupt.append(index)
+        return size, corrupt
+
+    workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(workers) as executor:
+        # Bound the frames in flight so large files are streamed
+        pending = deque()
+
+        def collect():
+            index, frame, future = pending.popleft()
+            if future.result():
+                add_size(index, frame)
+            else:
+                corrupt.append(index)
+
+        for index, frame in enumerate(frames):
+            pending.append((index, frame, executor.submit(frame.verify_compressed)))
+            while len(pending) > 2 * workers or (pending and pending[0][2].done()):
+                collect()
+
+        while pending:
+            collect()
+
+    return size, corrupt
@@ -1,40 +1,78 @@
-from collections import deque
-from copy import copy
-
-from bitsandbytes import BinInt, Bits, get_mask
-from huffmantree import HuffingTreeNode
+from typing import Optional
+
+from bitsandbytes import (
+    SIZE_HEADER_BYTES,
+    BinInt,
+    Bits,
+    get_mask,
+    read_size_header,
+    size_header,
+)
+from huffmantree import (
+    canonical_codes,
+    canonical_order,
+    code_lengths,
+    histogram,
+    length_counts,
+)
 
 
 def huffing_encode(string: bytearray | str) -> bytearray:
     if isinstance(string, str):
         string = bytearray(string, "utf-8")
 
-    sorted_encodings, lengths = HuffingTreeNode.create_huffing_tree(
-        string
-    ).canonicalized_encodings()
+    lengths = code_lengths(histogram(string))
+    codes = canonical_codes(lengths)
+    counts = length_counts(lengths)
 
-    max_bin_length = len(bin(max(lengths) + 1)) - 2
-    out = Bits()
+    max_bin_length = len(bin(max(counts, default=0) + 1)) - 2
+    out = Bits.from_byte_array(size_header(len(string)))
     out.append_binint(BinInt(max_bin_length, 4))
-    for length in lengths:
-        out.append_binint(BinInt(length, max_bin_length))
+    for count in counts:
+        out.append_binint(BinInt(count, max_bin_length))
     out.append_binint(BinInt((1 << max_bin_length) - 1, max_bin_length))
 
     out.fill_byte()
-    letters = bytearray(char for char, _ in sorted_encodings.items())
-    for letter in letters:
+    for letter in canonical_order(lengths):
         out.append_binint(BinInt(letter, 8))
 
+    encodings = [BinInt(code, length) for code, length in zip(codes, lengths)]
     for char in string:
-        encoding = sorted_encodings[char]
-        for bit in encoding:
-            out.append_bit(bit)
+        out.append_binint(encodings[char])
 
     return out.to_byte_array()
 
 
-def huffing_decode(string: bytearray) -> bytearray:
-    counts: deque[int] = deque()
+def huffing_max_decoded_size(encoded_size: int) -> int:
+    # Every letter takes at least one bit
+    return 8 * encoded_size
+
+
+def huffing_decoded_size(string: bytearray, max_size: Optional[int] = None) -> int:
+    limit = huffing_max_decoded_size(len(string))
+    if max_size is not None:
+        limit = min(limit, max_size)
+    return read_size_header(string, limit)
+
+
+def huffing_decode(string: bytearray, max_size: Optional[int] = None) -> bytearray:
+    out = bytearray(huffing_decoded_size(string, max_size))
+    huffing_decode_into(string, out)
+    return out
+
+
+def huffing_decode_into(
+    string: bytearray, buffer: bytearray | memoryview, max_size: Optional[int] = None
+) -> int:
+    size = huffing_decoded_size(string, max_size)
+    if size > len(buffer):
+        raise ValueError(f"Buffer is too small to hold {size} bytes")
+
+    out = memoryview(buffer)
+    string = memoryview(string)[SIZE_HEADER_BYTES:]
+    counts: list[int] = list()
+    if not len(string):
+        raise ValueError("The text to decode is truncated")
 
     bits = map(
         bool,
@@ -48,6 +86,8 @@ def huffing_decode(string: bytearray) -> bytearray:
     while True:
         bits = list()
         for _ in range(max_bin_length):
+            if byte >= len(string):
+                raise ValueError("The text to decode is truncated")
             bits.append(int(string[byte]) & get_mask(bit))
             bit += 1
             if bit >= 8:
@@ -60,39 +100,45 @@ def huffing_decode(string: bytearray) -> bytearray:
 
         counts.append(count)
 
-    if bit == 0:
-        byte -= 1
-    code = BinInt(0, 1)
-
-    encodings = dict()
-    letter_index = byte + 1
-    while len(counts):
-        if not counts[0]:
-            code.leftshiftonce()
-            counts.popleft()
-            continue
-
-        encodings[string[letter_index]] = copy(code)
-        letter_index += 1
-        counts[0] -= 1
-        code.inc()
-
-    tree = HuffingTreeNode.from_encodings(encodings)
-
-    bits = Bits.from_byte_array(string[letter_index:])
-    letters = bytearray()
-    current = tree
-    for bit in bits:
-        if bit:
-            current = current.right
-        else:
-            current = current.left
-
-        if current.letter is not None:
-            letters.append(current.letter)
-            current = tree
-
-    return letters
+    if size and not counts:
+        raise ValueError("Something is wrong with the text to decode!")
+
+    letter_index = byte if bit == 0 else byte + 1
+    letter_end = letter_index + sum(counts)
+    if letter_end > len(string):
+        raise ValueError("The text to decode is truncated")
+    order = string[letter_index:letter_end]
+
+    # Canonical decoding: codes of the same length are consecutive integers,
+    # so every length only needs its first code and its offset into order.
+    written = 0
+    code = first = index = length = 0
+    for byte in string[letter_end:]:
+        if written >= size:
+            break
+
+        for bit in range(8):
+            code |= bool(byte & get_mask(bit))
+            count = counts[length]
+            if code - first < count:
+                out[written] = order[index + code - first]
+                written += 1
+                if written >= size:
+                    break
+                code = first = index = length = 0
+                continue
+
+            index += count
+            first = (first + count) << 1
+            code <<= 1
+            length += 1
+            if length >= len(counts):
+                raise ValueError("Something is wrong with the text to decode!")
+
+    if written < size:
+        raise ValueError("The text to decode is truncated")
+
+    return written
 
 
 if __name__ == "__main__":
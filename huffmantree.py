@@ -1,164 +1,81 @@
-from collections import Counter
-from copy import copy
-from typing import Iterator, Optional
-
-from dataclasses import dataclass
-
-from bitsandbytes import BinInt
-
-
-@dataclass
-class HuffingTreeNode:
-    letter: Optional[int]
-    frequency: Optional[int]
-
-    left: Optional["HuffingTreeNode"]
-    right: Optional["HuffingTreeNode"]
-
-    def add_encoding(self, value: "BinInt", letter: int):
-        current = self
-        for choice in value:
-            if choice:
-                if current.right is None:
-                    current.right = HuffingTreeNode(None, None, None, None)
-                current = current.right
-            else:
-                if current.left is None:
-                    current.left = HuffingTreeNode(None, None, None, None)
-                current = current.left
-        current.letter = letter
-
-    def canonicalized_encodings(self) -> tuple[dict[int, BinInt], list[int]]:
-        sorted_encodings = sorted(
-            self.encodings.items(), key=lambda item: (len(item[1]), item[0])
-        )
-
-        encodings = {}
-
-        first_char, first_encoding = sorted_encodings[0]
-        code = BinInt(None, len(first_encoding))
-        encodings[first_char] = copy(code)
-
-        lengths: list[int] = [0 for _ in range(len(code))]
-        lengths[-1] = 1
-        for char, encoding in sorted_encodings[1:]:
-            code.inc()
-            while len(encoding) > len(code):
-                lengths.append(0)
-                code.leftshiftonce()
-            encodings[char] = copy(code)
-            lengths[-1] += 1
-
-        return encodings, lengths
-
-    @property
-    def encodings(self) -> dict[str, BinInt]:
-        def inner(root: HuffingTreeNode, code: BinInt) -> Iterator[tuple[str, BinInt]]:
-            if root.letter is not None:
-                encoding = BinInt(code.to_int(), len(code))
-                code.rightshiftonce()
-                yield root.letter, encoding
-            else:
-                code.leftshiftonce()
-                for char, encoding in inner(root.left, code):
-                    yield char, encoding
-
-                code.leftshiftonce()
-                code.inc()
-                for char, encoding in inner(root.right, code):
-                    yield char, encoding
-                code.rightshiftonce()
-
-        return {char: encoding for char, encoding in inner(self, BinInt())}
-
-    @classmethod
-    def from_encodings(cls, encodings: dict[int, BinInt]) -> "HuffingTreeNode":
-        tree = HuffingTreeNode(None, None, None, None)
-        for char, encoding in encodings.items():
-            tree.add_encoding(encoding, char)
-        return tree
-
-    @classmethod
-    def create_huffing_tree(cls, s: bytearray) -> "HuffingTreeNode":
-        heap = HuffingTreeHeap(
-            [
-                HuffingTreeNode(key, value, None, None)
-                for key, value in Counter(s).items()
-            ]
-        )
-
-        root = cls(None, None, None, None)
-
-        while len(heap) > 1:
-            left = heap.pop_head()
-            right = heap.pop_head()
-            root = cls(None, left.frequency + right.frequency, left, right)
-
-            heap.insert(root)
-
-        return root
-
-    def __eq__(self, other: "HuffingTreeNode"):
-        return self.frequency == other.frequency
-
-    def __lt__(self, other: "HuffingTreeNode"):
-        return self.frequency < other.frequency
-
-    def __ge__(self, other: "HuffingTreeNode"):
-        return not self < other
-
-    def __gt__(self, other: "HuffingTreeNode"):
-        return self.frequency > other.frequency
-
-    def __le__(self, other: "HuffingTreeNode"):
-        return not self > other
-
-
-class HuffingTreeHeap:
-    heap = list[HuffingTreeNode]
-
-    def __init__(self, heap: list[HuffingTreeNode]):
-        self.heap = heap[:]
-        for i in range((len(self) - 2) // 2, -1, -1):
-            self.fix_down(i)
-
-    def swap(self, a: int, b: int):
-        self.heap[a], self.heap[b] = self.heap[b], self.heap[a]
-
-    def fix_up(self, i: int):
-        child = i
-        parent = (child - 1) // 2
-        while parent >= 0 and self.heap[child] < self.heap[parent]:
-            self.swap(child, parent)
-            child = parent
-            parent = (child - 1) // 2
-
-    def fix_down(self, i: int):
-        while (_min := i * 2 + 1) < len(self):
-            if (right := _min + 1) < len(self) and self.heap[_min] > self.heap[right]:
-                _min = right
-
-            if self.heap[_min] < self.heap[i]:
-                self.heap[_min], self.heap[i] = self.heap[i], self.heap[_min]
-                i = _min
+from typing import Iterable
+
+
+def histogram(s: Iterable[int]) -> list[int]:
+    frequencies = [0] * 256
+    for char in s:
+        frequencies[char] += 1
+    return frequencies
+
+
+def code_lengths(frequencies: list[int]) -> list[int]:
+    """
+    Huffman code length of every symbol, using the two-queue method on flat
+    arrays. Symbols that never occur get length 0.
+    """
+    leaves = sorted(
+        (frequency, char) for char, frequency in enumerate(frequencies) if frequency
+    )
+    lengths = [0] * len(frequencies)
+    if len(leaves) == 1:
+        lengths[leaves[0][1]] = 1
+    if len(leaves) <= 1:
+        return lengths
+
+    # Leaves occupy 0..n-1 in increasing weight, internal nodes n..2n-2 are
+    # created in increasing weight as well, so both queues stay sorted.
+    n = len(leaves)
+    weights = [frequency for frequency, _ in leaves] + [0] * (n - 1)
+    parents = [0] * (2 * n - 1)
+    leaf = 0
+    node = n
+    for new in range(n, 2 * n - 1):
+        for _ in range(2):
+            if leaf < n and (node == new or weights[leaf] <= weights[node]):
+                child = leaf
+                leaf += 1
             else:
-                break
-
-    def insert(self, item: HuffingTreeNode):
-        i = len(self)
-        self.heap.append(item)
-        self.fix_up(i)
-
-    def pop_head(self):
-        self.swap(0, len(self) - 1)
-        result = self.heap.pop()
-
-        if len(self) == 0:
-            return result
-
-        self.fix_down(0)
-
-        return result
-
-    def __len__(self):
-        return len(self.heap)
+                child = node
+                node += 1
+            weights[new] += weights[child]
+            parents[child] = new
+
+    # Parents always have a higher index than their children
+    depths = [0] * (2 * n - 1)
+    for i in range(2 * n - 3, -1, -1):
+        depths[i] = depths[parents[i]] + 1
+
+    for i, (_, char) in enumerate(leaves):
+        lengths[char] = depths[i]
+
+    return lengths
+
+
+def length_counts(lengths: list[int]) -> list[int]:
+    """counts[i] is the number of symbols with a code of length i + 1."""
+    counts = [0] * max(lengths, default=0)
+    for length in lengths:
+        if length:
+            counts[length - 1] += 1
+    return counts
+
+
+def canonical_order(lengths: list[int]) -> list[int]:
+    """The symbols in canonical order, i.e. sorted by (code length, symbol)."""
+    return sorted(
+        (char for char, length in enumerate(lengths) if length),
+        key=lambda char: (lengths[char], char),
+    )
+
+
+def canonical_codes(lengths: list[int]) -> list[int]:
+    """The canonical code of every symbol, 0 for symbols without a code."""
+    codes = [0] * len(lengths)
+    code = 0
+    previous_length = 0
+    for char in canonical_order(lengths):
+        code <<= lengths[char] - previous_length
+        previous_length = lengths[char]
+        codes[char] = code
+        code += 1
+    return codes
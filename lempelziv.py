@@ -1,7 +1,27 @@
 from collections import deque
 from itertools import islice
+from typing import Optional
 
-from bitsandbytes import Bits, BinInt
+from bitsandbytes import (
+    SIZE_HEADER_BYTES,
+    Bits,
+    BinInt,
+    read_size_header,
+    size_header,
+)
+
+HISTORY_SIZE = 2 << 14 - 1
+
+# Repeat matches reuse one of the last few match offsets. Their identifier
+# packs the index of the offset and the match length into the negative range
+# below -HISTORY_SIZE, which plain matches never use.
+REPEAT_OFFSETS = 3
+REPEAT_IDENTIFIER = -(1 << 15)
+REPEAT_GOOD_LENGTH = 32
+
+# After 1 << SKIP_TRIGGER positions in a row without a match, the encoder
+# starts to skip positions when searching for the next one.
+SKIP_TRIGGER = 5
 
 class SearchPattern:
     _pattern: bytearray
@@ -144,6 +164,21 @@ class Block(Bits):
 
         return block
 
+    @classmethod
+    def from_repeated_section(cls, repeat: int, length: int):
+        if not (0 <= repeat < REPEAT_OFFSETS):
+            raise ValueError(f"Repeat must be between 0 and {REPEAT_OFFSETS - 1}")
+        if not (0 <= length < 256):
+            raise ValueError(
+                "Length must be positive and not greater than one byte of info"
+            )
+
+        identifier_bin = BinInt(REPEAT_IDENTIFIER + (repeat << 8) + length, 16)
+        block = cls()
+        block.append_binint(identifier_bin)
+
+        return block
+
     @classmethod
     def from_unmatched_section(cls, unmatched: bytearray):
         length_bin = BinInt(len(unmatched), 16)
@@ -156,35 +191,91 @@ class Block(Bits):
         return block
 
 
+def find_repeat_match(
+    text: bytearray,
+    start_index: int,
+    repeats: list[int],
+    min_length: int = 4,
+    max_length: int = 255,
+) -> tuple[int, int]:
+    best_match = (0, 0)  # (Index of repeat offset, letters in match)
+    for repeat, offset in enumerate(repeats):
+        match_start = start_index + offset
+        if (
+            text[match_start : match_start + min_length]
+            != text[start_index : start_index + min_length]
+        ):
+            continue
+
+        # The match has to lie within the history
+        limit = min(-offset, max_length, len(text) - start_index)
+        length = 0
+        while length < limit and text[match_start + length] == text[start_index + length]:
+            length += 1
+
+        if length >= min_length and length > best_match[1]:
+            best_match = (repeat, length)
+
+    return best_match
+
+
+def update_repeats(repeats: list[int], offset: int):
+    if offset in repeats:
+        repeats.remove(offset)
+    repeats.insert(0, offset)
+    del repeats[REPEAT_OFFSETS:]
+
+
 def lempelziv_encode(text: bytearray | str) -> bytearray:
     if isinstance(text, str):
         text = bytearray(text, "utf-8")
 
-    max_history = 2 << 14 - 1
-    history = History(max_history)
+    history = History(HISTORY_SIZE)
+    repeats: list[int] = list()
+    misses = 0
 
-    out = Bits()
+    out = Bits.from_byte_array(size_header(len(text)))
 
     unmatched = bytearray()
     i = 0
     while i < len(text):
         # Unmatched is full
-        if len(unmatched) > max_history:
+        if len(unmatched) > HISTORY_SIZE:
             out.append_bits(Block.from_unmatched_section(unmatched))
             unmatched = bytearray()
 
-        # Find best match and react accordingly
-        best_match = history.find_best_match(text, i)
-        if best_match[0] == 0:
-            unmatched.append(text[i])
+        # Try the recent offsets before searching the whole history, a long
+        # enough repeat match is taken without searching
+        repeat, advance = find_repeat_match(text, i, repeats)
+        best_match = (0, 1)
+        if advance < REPEAT_GOOD_LENGTH:
+            best_match = history.find_best_match(text, i)
+
+        # A repeat match is one byte shorter than a plain match
+        if advance and advance + 1 >= best_match[1]:
+            block = Block.from_repeated_section(repeat, advance)
+            update_repeats(repeats, repeats[repeat])
+        elif best_match[0] != 0:
+            block = Block.from_matched_section(*best_match)
+            update_repeats(repeats, best_match[0])
+            advance = best_match[1]
         else:
+            block = None
+
+        # React accordingly
+        if block is None:
+            misses += 1
+            advance = min(1 + (misses >> SKIP_TRIGGER), len(text) - i)
+            unmatched += text[i : i + advance]
+        else:
+            misses = 0
             if len(unmatched):
                 out.append_bits(Block.from_unmatched_section(unmatched))
                 unmatched = bytearray()
-            out.append_bits(Block.from_matched_section(*best_match))
+            out.append_bits(block)
 
         # Increment history and current index
-        for _ in range(best_match[1]):
+        for _ in range(advance):
             history.append(text[i])
             i += 1
 
@@ -195,31 +286,80 @@ def lempelziv_encode(text: bytearray | str) -> bytearray:
     return out.to_byte_array()
 
 
-def lempelziv_decode(text: bytearray | str) -> bytearray:
-    out = bytearray()
+def lempelziv_max_encoded_size(size: int) -> int:
+    # A literal block costs at most three bytes per byte it holds, and a
+    # match costs three bytes for at least four.
+    return SIZE_HEADER_BYTES + 3 * size
 
-    i = 0
-    history = History(2 << 14 - 1)
-    while i < len(text) - 1:
+
+def lempelziv_max_decoded_size(encoded_size: int) -> int:
+    # The shortest block is a two byte repeat match of at most 255 letters
+    return max(encoded_size - SIZE_HEADER_BYTES, 0) // 2 * 255
+
+
+def lempelziv_decoded_size(text: bytearray, max_size: Optional[int] = None) -> int:
+    limit = lempelziv_max_decoded_size(len(text))
+    if max_size is not None:
+        limit = min(limit, max_size)
+    return read_size_header(text, limit)
+
+
+def lempelziv_decode(text: bytearray, max_size: Optional[int] = None) -> bytearray:
+    out = bytearray(lempelziv_decoded_size(text, max_size))
+    lempelziv_decode_into(text, out)
+    return out
+
+
+def lempelziv_decode_into(
+    text: bytearray, buffer: bytearray | memoryview, max_size: Optional[int] = None
+) -> int:
+    size = lempelziv_decoded_size(text, max_size)
+    if size > len(buffer):
+        raise ValueError(f"Buffer is too small to hold {size} bytes")
+
+    # The output itself serves as the history
+    out = memoryview(buffer)
+    repeats: list[int] = list()
+    written = 0
+    i = SIZE_HEADER_BYTES
+    while written < size:
+        if i + 2 > len(text):
+            raise ValueError("The text to decode is truncated")
         identifier = BinInt((text[i] << 8) + text[i + 1], 16)
         i += 2
 
         identifier_int = identifier.to_int(signed=True)
-        if identifier_int < 0:
-            length = text[i]
-            i += 1
-            new_text = history.retrive(identifier_int, length)
-        elif identifier_int == 0:
+        if identifier_int == 0:
             raise ValueError("Something is wrong with the text to decode!")
-        else:
+        elif identifier_int > 0:
             new_text = text[i : i + identifier_int]
             i += identifier_int
+        else:
+            if identifier_int < -HISTORY_SIZE:
+                repeat, length = divmod(identifier_int - REPEAT_IDENTIFIER, 1 << 8)
+                if repeat >= len(repeats):
+                    raise ValueError("Something is wrong with the text to decode!")
+                offset = repeats[repeat]
+            else:
+                if i >= len(text):
+                    raise ValueError("The text to decode is truncated")
+                length = text[i]
+                i += 1
+                offset = identifier_int
+
+            start = written + offset
+            if start < 0 or start + length > written:
+                raise ValueError("Something is wrong with the text to decode!")
+            new_text = out[start : start + length]
+            update_repeats(repeats, offset)
+
+        end = written + len(new_text)
+        if end > size:
+            raise ValueError("Something is wrong with the text to decode!")
+        out[written:end] = new_text
+        written = end
 
-        for letter in new_text:
-            history.append(letter)
-            out.append(letter)
-
-    return out
+    return written
 
 
 if __name__ == "__main__":